@@ -0,0 +1,225 @@
+"""
+budget.py
+
+Per-run deadline and budgets with cooperative cancellation.
+
+Each workflow run carries a `RunBudget`: a wall-clock deadline plus token and
+crawl budgets. The active budget lives in a context variable, so every step,
+model call and crawl started from the run sees it without extra plumbing:
+- `BudgetedOpenAIResponses` charges every model response (streamed or not),
+- `enforce_budget` (async agent/team tool hook) short-circuits tool calls once
+  the budget is exhausted, telling the model to finalize,
+- `record_step_output` (agent/team post hook) keeps each step's structured
+  output for partial reports,
+- `CrawlTools` charges crawls and cancels in-flight browser pages via `guard`,
+- `run_with_budget` in main.py cancels the whole workflow via `guard`, after a
+  grace window that lets the team finalize.
+
+Limits are soft first: once the deadline or token budget is reached, tools
+refuse to run and models are asked to finalize. The hard cancel only happens
+`grace_seconds` later.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, TypeVar
+
+from agno.models.openai import OpenAIResponses
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+# Defaults (overridable via .env)
+RUN_DEADLINE_SECONDS = float(os.getenv("RUN_DEADLINE_SECONDS", "300"))
+RUN_GRACE_SECONDS = float(os.getenv("RUN_GRACE_SECONDS", "30"))
+RUN_TOKEN_BUDGET = int(os.getenv("RUN_TOKEN_BUDGET", "500000"))
+RUN_CRAWL_BUDGET = int(os.getenv("RUN_CRAWL_BUDGET", "25"))
+
+# Do not start a crawl with less time than this left.
+MIN_CRAWL_SECONDS = 5.0
+
+BUDGET_EXHAUSTED_MESSAGE = (
+    "BUDGET EXHAUSTED ({reason}). Do not call more tools: finalize now with the evidence gathered so far."
+)
+
+
+class BudgetExceeded(Exception):
+    """Raised when a run hits its deadline, token budget or crawl budget."""
+
+
+class RunBudget:
+    """Wall-clock deadline plus token and crawl budgets for one workflow run."""
+
+    def __init__(
+        self,
+        deadline_seconds: float = RUN_DEADLINE_SECONDS,
+        max_tokens: int = RUN_TOKEN_BUDGET,
+        max_crawls: int = RUN_CRAWL_BUDGET,
+        grace_seconds: float = RUN_GRACE_SECONDS,
+    ):
+        self.deadline = time.monotonic() + deadline_seconds
+        self.max_tokens = max_tokens
+        self.max_crawls = max_crawls
+        self.grace_seconds = grace_seconds
+        self.tokens_used = 0
+        self.crawled_urls: List[str] = []
+        self.step_outputs: Dict[str, List[BaseModel]] = {}
+        self._lock = threading.Lock()
+        # Guarded tasks -> grace before their hard cancel once tokens run out.
+        self._guarded: Dict[asyncio.Task, float] = {}
+        self._cancelled: set = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    # -- state ---------------------------------------------------------
+    def remaining_seconds(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def remaining_tokens(self) -> int:
+        return max(0, self.max_tokens - self.tokens_used)
+
+    def exhausted_reason(self) -> Optional[str]:
+        """Why the run must wrap up, or None while it may continue (crawls are capped separately)."""
+        if self.remaining_seconds() <= 0:
+            return "deadline reached"
+        if self.tokens_used >= self.max_tokens:
+            return f"token budget of {self.max_tokens} used"
+        return None
+
+    # -- charging ------------------------------------------------------
+    def charge_tokens(self, tokens: int) -> None:
+        with self._lock:
+            was_exhausted = self.tokens_used >= self.max_tokens
+            self.tokens_used += tokens
+            just_exhausted = not was_exhausted and self.tokens_used >= self.max_tokens
+        if just_exhausted and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._schedule_cancels)
+
+    def charge_crawl(self, url: str) -> None:
+        """Reserve one crawl; raises BudgetExceeded if none is left."""
+        with self._lock:
+            reason = self.exhausted_reason()
+            if reason is None and self.remaining_seconds() < MIN_CRAWL_SECONDS:
+                reason = f"less than {MIN_CRAWL_SECONDS:.0f}s left"
+            if reason is None and len(self.crawled_urls) >= self.max_crawls:
+                reason = f"crawl budget of {self.max_crawls} used"
+            if reason:
+                raise BudgetExceeded(reason)
+            self.crawled_urls.append(url)
+
+    def record_output(self, content: BaseModel) -> None:
+        self.step_outputs.setdefault(type(content).__name__, []).append(content)
+
+    # -- cancellation --------------------------------------------------
+    async def guard(self, awaitable: Awaitable[T], grace_seconds: float = 0.0) -> T:
+        """
+        Await `awaitable`, cancelling it `grace_seconds` after the budget is exhausted.
+
+        The deadline is enforced with `asyncio.wait_for`; the token budget,
+        which only changes when a model call is charged, schedules the cancel
+        from `charge_tokens`. Raises BudgetExceeded after the cancelled task
+        has unwound, so `async with` blocks inside it (e.g., browser pages)
+        close cleanly.
+        """
+        self._loop = asyncio.get_running_loop()
+        task = asyncio.ensure_future(awaitable)
+        self._guarded[task] = grace_seconds
+        if self.tokens_used >= self.max_tokens:
+            self._schedule_cancels()
+        try:
+            return await asyncio.wait_for(task, timeout=self.remaining_seconds() + grace_seconds)
+        except asyncio.TimeoutError:
+            raise BudgetExceeded("deadline reached") from None
+        except asyncio.CancelledError:
+            if task not in self._cancelled:
+                raise
+            raise BudgetExceeded(self.exhausted_reason() or "budget exhausted") from None
+        finally:
+            self._guarded.pop(task, None)
+            self._cancelled.discard(task)
+
+    def _schedule_cancels(self) -> None:
+        for task, grace_seconds in list(self._guarded.items()):
+            self._loop.call_later(grace_seconds, self._cancel, task)
+
+    def _cancel(self, task: asyncio.Task) -> None:
+        if not task.done():
+            self._cancelled.add(task)
+            task.cancel()
+
+
+# The budget of the run executing in the current context (None = unbounded).
+current_budget: ContextVar[Optional[RunBudget]] = ContextVar("current_budget", default=None)
+
+
+# ---------------------------------------------------------------------
+# Budget-aware model
+# ---------------------------------------------------------------------
+class BudgetedOpenAIResponses(OpenAIResponses):
+    """
+    OpenAIResponses that charges every response to the run's token budget.
+
+    Calls are not capped per request: the budget is a soft stop, so a call
+    started just before it runs out may finish (and write the final answer).
+    """
+
+    def invoke(self, *args: Any, **kwargs: Any) -> Any:
+        response = super().invoke(*args, **kwargs)
+        _charge_response(response)
+        return response
+
+    async def ainvoke(self, *args: Any, **kwargs: Any) -> Any:
+        response = await super().ainvoke(*args, **kwargs)
+        _charge_response(response)
+        return response
+
+    def invoke_stream(self, *args: Any, **kwargs: Any) -> Iterator[Any]:
+        for delta in super().invoke_stream(*args, **kwargs):
+            _charge_response(delta)
+            yield delta
+
+    async def ainvoke_stream(self, *args: Any, **kwargs: Any) -> AsyncIterator[Any]:
+        async for delta in super().ainvoke_stream(*args, **kwargs):
+            _charge_response(delta)
+            yield delta
+
+
+def _charge_response(response: Any) -> None:
+    """Charge a ModelResponse (or the stream delta carrying the usage) to the run's budget."""
+    budget = current_budget.get()
+    usage = getattr(response, "response_usage", None)
+    if budget is not None and usage is not None:
+        budget.charge_tokens(usage.total_tokens or 0)
+
+
+# ---------------------------------------------------------------------
+# Agno hooks
+# ---------------------------------------------------------------------
+async def enforce_budget(function_name: str, function_call: Callable, arguments: Dict[str, Any]) -> Any:
+    """
+    Tool hook: skip the tool call and ask the model to finalize once the budget is exhausted.
+
+    Async because agno's async runs pass the next link of the hook chain as a
+    coroutine function (agno skips async hooks in sync runs: use `arun`).
+    """
+    budget = current_budget.get()
+    reason = budget.exhausted_reason() if budget else None
+    if reason:
+        return BUDGET_EXHAUSTED_MESSAGE.format(reason=reason)
+    result = function_call(**arguments)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+def record_step_output(run_output: Any) -> None:
+    """Post hook: keep the run's structured output for partial reports."""
+    budget = current_budget.get()
+    content = getattr(run_output, "content", None)
+    if budget is not None and isinstance(content, BaseModel):
+        budget.record_output(content)
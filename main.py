@@ -4,6 +4,7 @@ main.py
 Bike Weight Finder — teaching-friendly multi-step AI workflow.
 
 This script orchestrates a 4-stage pipeline:
+0) Official page lookup in the local brand sitemap index (skips 1-2 on a hit)
 1) Broad web search (collect candidate pages)
 2) URL selection (pick the most relevant sources)
 3) Scraping strategy analysis (robots/meta checks + basic page analysis)
@@ -16,21 +17,34 @@ Run:
 from __future__ import annotations
 
 import os
+import re
 import asyncio
 import random
 import time
 from dotenv import load_dotenv
 
+# Load environment variables first: budget.py, tools.py and sitemaps.py read theirs at import time
+load_dotenv()
+
 from agno.tools import Toolkit
 from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
 
 from agno.agent import Agent
-from agno.models.openai import OpenAIResponses
-from agno.workflow import Workflow, Step
+from agno.workflow import Workflow, Step, Condition
+from agno.workflow.types import StepInput, StepOutput
 from agno.team import Team
 from agno.tools.websearch import WebSearchTools
 
+from budget import (
+    BudgetExceeded,
+    BudgetedOpenAIResponses,
+    RunBudget,
+    current_budget,
+    enforce_budget,
+    record_step_output,
+)
 from tools import CrawlTools
+from sitemaps import BRAND_DOMAINS, BrandSitemapIndex
 
 from prompts import (
     BICYCLE_WEIGHT_SEARCH_SYSTEM_MESSAGE,
@@ -43,11 +57,12 @@ from schemas import (
     RawSearchOutput,
     BikeWeightSearchOutput,
     BikeWeightStrategyOutput,
-    BikeWeightReportOutput
+    BikeWeightScraperOutput,
+    BikeWeightReportOutput,
+    UrlExtractionDetail,
+    SELECTED_URL_COUNT,
 )
 
-# Load environment variables
-load_dotenv()
 if not os.getenv("OPENAI_API_KEY"):
     raise RuntimeError("OPENAI_API_KEY is not set.")
 
@@ -55,21 +70,58 @@ if not os.getenv("OPENAI_API_KEY"):
 INTELLIGENT_MODEL_ID = os.getenv("INTELLIGENT_MODEL_ID", "gpt-5.1")
 CORE_MODEL_ID = os.getenv("CORE_MODEL_ID", "gpt-5-mini")
 REASONING_EFFORT = os.getenv("REASONING_EFFORT", "high")
+MODEL_TIMEOUT_SECONDS = float(os.getenv("MODEL_TIMEOUT_SECONDS", "120"))
 
-search_model = OpenAIResponses(id=CORE_MODEL_ID, reasoning_effort=REASONING_EFFORT)
-filter_search_model = OpenAIResponses(id=INTELLIGENT_MODEL_ID, reasoning_effort=REASONING_EFFORT)
-core_model = OpenAIResponses(id=CORE_MODEL_ID, reasoning_effort=REASONING_EFFORT)
-team_model = OpenAIResponses(id=INTELLIGENT_MODEL_ID, reasoning_effort=REASONING_EFFORT)
+search_model = BudgetedOpenAIResponses(id=CORE_MODEL_ID, reasoning_effort=REASONING_EFFORT, timeout=MODEL_TIMEOUT_SECONDS)
+filter_search_model = BudgetedOpenAIResponses(id=INTELLIGENT_MODEL_ID, reasoning_effort=REASONING_EFFORT, timeout=MODEL_TIMEOUT_SECONDS)
+core_model = BudgetedOpenAIResponses(id=CORE_MODEL_ID, reasoning_effort=REASONING_EFFORT, timeout=MODEL_TIMEOUT_SECONDS)
+team_model = BudgetedOpenAIResponses(id=INTELLIGENT_MODEL_ID, reasoning_effort=REASONING_EFFORT, timeout=MODEL_TIMEOUT_SECONDS)
 
-SEARCH_TOOL_CALL_LIMIT = 5
-STRATEGY_TOOL_CALL_LIMIT = 10
-SCRAPER_TOOL_CALL_LIMIT = 10
+# Upper bounds per agent; the run's RunBudget (budget.py) stops them earlier if needed
+SEARCH_TOOL_CALL_LIMIT = int(os.getenv("SEARCH_TOOL_CALL_LIMIT", "5"))
+STRATEGY_TOOL_CALL_LIMIT = int(os.getenv("STRATEGY_TOOL_CALL_LIMIT", "10"))
+SCRAPER_TOOL_CALL_LIMIT = int(os.getenv("SCRAPER_TOOL_CALL_LIMIT", "10"))
 
 DEBUG_MODE = True
 
 # Initialize Tools
 crawl4ai_toolkit = CrawlTools()
 
+# Brand sitemap index: queried before web search (refreshed from __main__)
+sitemap_index = BrandSitemapIndex()
+
+OFFICIAL_PAGES_HEADER = "Official product pages (resolved from the brand sitemap index, web search skipped):"
+
+
+def _target_field(input_prompt: str, name: str) -> str:
+    match = re.search(rf"{name}:\s*(.+)", input_prompt)
+    return match.group(1).strip() if match else "Unknown"
+
+
+# ------------------------------------------------------------------------
+# STEP 0: Official Page Lookup (brand sitemap index)
+# ------------------------------------------------------------------------
+def resolve_official_pages(step_input: StepInput) -> StepOutput:
+    """Resolve the official product pages locally; pass the prompt through on a miss."""
+    input_prompt = str(step_input.input)
+    year = _target_field(input_prompt, "Year")
+    urls = sitemap_index.lookup(
+        _target_field(input_prompt, "Brand"),
+        _target_field(input_prompt, "Model"),
+        None if year == "Unknown" else year,
+        limit=SELECTED_URL_COUNT,
+    )
+    if not urls:
+        return StepOutput(content=input_prompt)
+    url_lines = "\n".join(f"  - {url}" for url in urls)
+    return StepOutput(content=f"{input_prompt.strip()}\n\n{OFFICIAL_PAGES_HEADER}\n{url_lines}")
+
+
+def official_pages_missing(step_input: StepInput) -> bool:
+    """Run web search + URL selection only when Step 0 found nothing."""
+    return OFFICIAL_PAGES_HEADER not in str(step_input.previous_step_content or "")
+
+
 # ------------------------------------------------------------------------
 # STEP 1: Broad Search Agent
 # ------------------------------------------------------------------------
@@ -79,6 +131,8 @@ bicycle_weight_search_agent = Agent(
     tool_call_limit=SEARCH_TOOL_CALL_LIMIT,
     system_message=BICYCLE_WEIGHT_SEARCH_SYSTEM_MESSAGE,
     output_schema=RawSearchOutput,
+    tool_hooks=[enforce_budget],
+    post_hooks=[record_step_output],
     debug_mode=DEBUG_MODE
 )
 
@@ -89,6 +143,7 @@ bicycle_weight_selector_agent = Agent(
     model=filter_search_model,
     system_message=BICYCLE_WEIGHT_SELECTOR_SYSTEM_MESSAGE,
     output_schema=BikeWeightSearchOutput,
+    post_hooks=[record_step_output],
     debug_mode=DEBUG_MODE
 )
 
@@ -101,6 +156,8 @@ bicycle_weight_scraping_analyst_agent = Agent(
     tool_call_limit=STRATEGY_TOOL_CALL_LIMIT,
     system_message=BICYCLE_WEIGHT_STRATEGY_SYSTEM_MESSAGE,
     output_schema=BikeWeightStrategyOutput,
+    tool_hooks=[enforce_budget],
+    post_hooks=[record_step_output],
     debug_mode=DEBUG_MODE
 )
 
@@ -112,6 +169,9 @@ bicycle_weight_scraper = Agent(
     tools=[crawl4ai_toolkit],
     tool_call_limit=SCRAPER_TOOL_CALL_LIMIT,
     system_message=BICYCLE_WEIGHT_SCRAPER_SYSTEM_MESSAGE,
+    output_schema=BikeWeightScraperOutput,
+    tool_hooks=[enforce_budget],
+    post_hooks=[record_step_output, crawl4ai_toolkit.record_extraction],
     debug_mode=DEBUG_MODE
 )
 
@@ -123,6 +183,8 @@ bicycle_weight_scraper_team = Team(
     markdown=True,
     show_members_responses=True,
     output_schema=BikeWeightReportOutput,
+    tool_hooks=[enforce_budget],
+    post_hooks=[record_step_output],
     debug_mode=DEBUG_MODE
 )
 
@@ -133,12 +195,22 @@ bike_weight_workflow = Workflow(
     name="Bike Weight Finder",
     steps=[
         Step(
-            name="Broad Web Search",
-            agent=bicycle_weight_search_agent
+            name="Official Page Lookup",
+            executor=resolve_official_pages
         ),
-        Step(
-            name="URL Filtering & Selection",
-            agent=bicycle_weight_selector_agent
+        Condition(
+            name="Web Search Fallback",
+            evaluator=official_pages_missing,
+            steps=[
+                Step(
+                    name="Broad Web Search",
+                    agent=bicycle_weight_search_agent
+                ),
+                Step(
+                    name="URL Filtering & Selection",
+                    agent=bicycle_weight_selector_agent
+                ),
+            ],
         ),
         Step(
             name="Web Scraping Strategy Analysis",
@@ -152,6 +224,106 @@ bike_weight_workflow = Workflow(
     debug_mode=DEBUG_MODE
 )
 
+
+# ------------------------------------------------------------------------
+# BUDGETED EXECUTION
+# ------------------------------------------------------------------------
+def build_partial_report(input_prompt: str, budget: RunBudget, reason: str) -> BikeWeightReportOutput:
+    """Best-effort report from whatever the run produced before its budget ran out."""
+    year = _target_field(input_prompt, "Year")
+    rows = [
+        row
+        for output in budget.step_outputs.get(BikeWeightScraperOutput.__name__, [])
+        for row in output.extraction_results
+    ]
+    found = [row for row in rows if row.status == "OK"]
+    # Prefer rows that state the target year, then rows that state no year.
+    found.sort(key=lambda row: 0 if row.year == year else (1 if row.year is None else 2))
+
+    urls: list[str] = []
+    for strategy in budget.step_outputs.get(BikeWeightStrategyOutput.__name__, [])[-1:]:
+        urls += [analysis.url for analysis in strategy.analysis_report]
+    for selection in budget.step_outputs.get(BikeWeightSearchOutput.__name__, [])[-1:]:
+        urls += selection.urls
+    urls += [row.url for row in rows]
+    urls = list(dict.fromkeys(urls))[:SELECTED_URL_COUNT]
+
+    details = []
+    for url in urls:
+        url_rows = [row for row in found if row.url == url]
+        if url_rows:
+            best = url_rows[0]
+            observations = f"{best.weight_value}: {best.evidence_snippet} (run stopped early: {reason})"
+        else:
+            observations = f"No weight extracted before the run stopped ({reason})."
+        details.append(UrlExtractionDetail(url=url, data_found=bool(url_rows), observations=observations))
+    if not details:
+        details.append(
+            UrlExtractionDetail(url="N/A", data_found=False, observations=f"Run stopped before any URL was selected ({reason}).")
+        )
+
+    return BikeWeightReportOutput(
+        brand=_target_field(input_prompt, "Brand"),
+        model=_target_field(input_prompt, "Model"),
+        year=year,
+        final_weight=found[0].weight_value if found else "Not Found",
+        confidence="Low",
+        url_details=details,
+    )
+
+
+async def run_with_budget(input_prompt: str, budget: RunBudget | None = None) -> BikeWeightReportOutput:
+    """
+    Run the workflow under a wall-clock deadline plus token and crawl budgets.
+
+    The budget is propagated to every step, model call and crawl through
+    `current_budget`. Once it is exhausted, tools refuse to run so the team
+    can finalize; if it has not finished `grace_seconds` later, the run is
+    cancelled and a partial `BikeWeightReportOutput` is returned.
+    """
+    budget = budget or RunBudget()
+    token = current_budget.set(budget)
+    try:
+        run_output = await budget.guard(bike_weight_workflow.arun(input_prompt), grace_seconds=budget.grace_seconds)
+        if isinstance(run_output.content, BikeWeightReportOutput):
+            return run_output.content
+        return build_partial_report(input_prompt, budget, "no final report produced")
+    except BudgetExceeded as e:
+        return build_partial_report(input_prompt, budget, str(e))
+    finally:
+        current_budget.reset(token)
+
+
+# ------------------------------------------------------------------------
+# BATCH EXECUTION
+# ------------------------------------------------------------------------
+async def run_batch(input_prompts: list[str]) -> tuple[list, dict]:
+    """
+    Run several lookups concurrently (e.g., a brand-wide batch).
+
+    All runs share `crawl4ai_toolkit`, so targets that select the same URL
+    are coalesced into a single crawl, and the rows the scraper extracts from
+    a page (one per size/trim/year) are reused by every other lookup.
+    Each run gets its own `RunBudget`.
+
+    Returns the per-lookup results and this batch's crawl stats.
+    """
+    crawls_before = crawl4ai_toolkit.crawl_count
+    requests_before = crawl4ai_toolkit.crawl_requests
+    results = await asyncio.gather(
+        *(run_with_budget(prompt) for prompt in input_prompts),
+        return_exceptions=True,
+    )
+    crawls = crawl4ai_toolkit.crawl_count - crawls_before
+    stats = {
+        "lookups": len(input_prompts),
+        "crawl_requests": crawl4ai_toolkit.crawl_requests - requests_before,
+        "crawls": crawls,
+        "crawls_per_lookup": crawls / max(len(input_prompts), 1),
+    }
+    return results, stats
+
+
 if __name__ == "__main__":
     input_prompt = """
 Find the weight of the bike:
@@ -159,13 +331,14 @@ Find the weight of the bike:
   - Model: Track 00
   - Year: 2026
 """
+    target_brand = _target_field(input_prompt, "Brand").lower()
+    if target_brand in BRAND_DOMAINS and not sitemap_index.has_brand(target_brand):
+        # Cold index: build the target brand first so Step 0 can hit on this run.
+        sitemap_index.refresh_all({target_brand: BRAND_DOMAINS[target_brand]})
+    sitemap_index.start_background_refresh()
     try:
-        asyncio.run(
-            bike_weight_workflow.aprint_response(
-                input_prompt,
-                markdown=True,
-            )
-        )
+        report = asyncio.run(run_with_budget(input_prompt))
+        print(report.model_dump_json(indent=2))
     except KeyboardInterrupt:
         print("\nProcess interrupted by user.")
     except Exception as e:
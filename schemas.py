@@ -78,9 +78,12 @@ class BikeWeightStrategyOutput(BaseModel):
 
     analysis_report: List[UrlAnalysis] = Field(
         ...,
-        min_items=SELECTED_URL_COUNT,
+        min_items=1,
         max_items=SELECTED_URL_COUNT,
-        description=f"Exactly {SELECTED_URL_COUNT} analyses (one per selected URL).",
+        description=(
+            f"One analysis per URL: {SELECTED_URL_COUNT} selected URLs, "
+            "or fewer official pages resolved from the brand sitemap index."
+        ),
     )
 
 
@@ -88,9 +91,12 @@ class BikeWeightStrategyOutput(BaseModel):
 # Step 4 — Per-URL extraction output (member agent output)
 # ---------------------------------------------------------------------
 class ScraperRow(BaseModel):
-    """Extraction result for one URL."""
+    """Extraction result for one URL and one size/variant/year listed on it."""
 
     url: str = Field(..., description="The URL that was crawled.")
+    size: Optional[str] = Field(None, description="Frame size the weight refers to (e.g., 'M', '54 cm'), if stated.")
+    variant: Optional[str] = Field(None, description="Trim/build the weight refers to (e.g., 'Ultegra Di2'), if stated.")
+    year: Optional[str] = Field(None, description="Model year the weight refers to, if stated.")
     weight_value: str = Field(..., description="Exact weight text (e.g., '7.8 kg') or 'NOT FOUND'.")
     evidence_snippet: str = Field(..., description="Context snippet (max 160 chars) showing the weight.")
     status: Literal["OK", "NOT FOUND", "BLOCKED (robots/meta)"] = Field(
@@ -103,13 +109,14 @@ class ScraperRow(BaseModel):
 
 
 class BikeWeightScraperOutput(BaseModel):
-    """Output contract for the scraper agent (one row per selected URL)."""
+    """Output contract for the scraper agent (one or more rows per selected URL)."""
 
     extraction_results: List[ScraperRow] = Field(
         ...,
-        min_items=SELECTED_URL_COUNT,
-        max_items=SELECTED_URL_COUNT,
-        description=f"Exactly {SELECTED_URL_COUNT} extraction rows (one per URL).",
+        min_items=1,
+        description=(
+            "One row per URL, plus one per extra size/trim/year weight listed on the same page."
+        ),
     )
 
 
@@ -134,7 +141,7 @@ class BikeWeightReportOutput(BaseModel):
     confidence: ConfidenceLevel = Field(..., description="Confidence in the final_weight field.")
     url_details: List[UrlExtractionDetail] = Field(
         ...,
-        min_items=SELECTED_URL_COUNT,
+        min_items=1,
         max_items=SELECTED_URL_COUNT,
-        description=f"Exactly {SELECTED_URL_COUNT} per-URL details.",
+        description=f"One detail per evaluated URL (at most {SELECTED_URL_COUNT}).",
     )
@@ -0,0 +1,270 @@
+"""
+sitemaps.py
+
+Brand sitemap crawler and local product-URL index.
+
+For brands we query repeatedly, the official product page is almost always
+listed in the brand's own sitemap. This module:
+- reads the sitemaps declared in `robots.txt` (following nested and gzipped
+  sitemap indexes),
+- streams every sitemap with `iterparse`, so large files are never loaded
+  entirely into memory,
+- keeps a small JSON index of product URLs tokenized by model name and year,
+- refreshes incrementally: a child sitemap whose `<lastmod>` has not changed
+  since the last run is skipped.
+
+The index is consumed by the "Official Page Lookup" step in main.py: on a hit
+the workflow skips web search and URL selection entirely.
+"""
+
+from __future__ import annotations
+
+import gzip
+import io
+import json
+import logging
+import os
+import re
+import threading
+import urllib.request
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+from xml.etree.ElementTree import iterparse
+
+logger = logging.getLogger(__name__)
+
+# ---------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------
+# Known brand domains (brand name, lowercase -> domain).
+# Extend via env, e.g.: BRAND_DOMAINS="orbea=orbea.com,canyon=canyon.com"
+BRAND_DOMAINS: Dict[str, str] = {
+    "megamo": "megamo.com",
+}
+for _pair in filter(None, os.getenv("BRAND_DOMAINS", "").split(",")):
+    _brand, _, _domain = _pair.partition("=")
+    if _brand.strip() and _domain.strip():
+        BRAND_DOMAINS[_brand.strip().lower()] = _domain.strip()
+
+SITEMAP_INDEX_PATH = os.getenv("SITEMAP_INDEX_PATH", ".sitemap_index.json")
+SITEMAP_USER_AGENT = "BikeWeightFinder/1.0 (+sitemap indexer)"
+SITEMAP_TIMEOUT_SECONDS = 30
+MAX_SITEMAP_DEPTH = 3
+
+# Only URLs matching the brand's product pattern are indexed (allow-list).
+# The default covers the usual `/bikes/<slug>`-style catalog paths; add a
+# brand entry when its product pages live elsewhere.
+DEFAULT_PRODUCT_PATTERN = r"/(bikes?|bicycles?|bicicletas?|products?|productos?|models?)/[^/]+"
+BRAND_PRODUCT_PATTERNS: Dict[str, str] = {}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_YEAR_RE = re.compile(r"^(19|20)\d{2}$")
+
+
+# ---------------------------------------------------------------------
+# Tokenization
+# ---------------------------------------------------------------------
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric tokens (e.g., 'Track 00' -> ['track', '00'])."""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def url_tokens(url: str) -> Tuple[List[str], List[str]]:
+    """Split a product URL path into (model tokens, year tokens)."""
+    tokens = tokenize(urlparse(url).path)
+    years = [t for t in tokens if _YEAR_RE.match(t)]
+    return [t for t in tokens if t not in years], years
+
+
+def is_product_url(brand: str, url: str) -> bool:
+    """True when the URL path matches the brand's product-page pattern."""
+    pattern = BRAND_PRODUCT_PATTERNS.get(brand.lower(), DEFAULT_PRODUCT_PATTERN)
+    return re.search(pattern, urlparse(url).path.lower()) is not None
+
+
+# ---------------------------------------------------------------------
+# Streaming fetch + parse
+# ---------------------------------------------------------------------
+def _open(url: str) -> io.BufferedReader:
+    """Open a URL as a byte stream, transparently gunzipping if needed."""
+    request = urllib.request.Request(url, headers={"User-Agent": SITEMAP_USER_AGENT})
+    stream = io.BufferedReader(urllib.request.urlopen(request, timeout=SITEMAP_TIMEOUT_SECONDS))
+    if stream.peek(2)[:2] == b"\x1f\x8b":
+        return io.BufferedReader(gzip.GzipFile(fileobj=stream))
+    return stream
+
+
+def robots_sitemaps(domain: str) -> List[str]:
+    """Return the sitemap URLs declared in `https://<domain>/robots.txt`."""
+    sitemaps = []
+    with _open(f"https://{domain}/robots.txt") as stream:
+        for raw_line in stream:
+            key, _, value = raw_line.decode("utf-8", "replace").partition(":")
+            if key.strip().lower() == "sitemap" and value.strip():
+                sitemaps.append(value.strip())
+    return sitemaps or [f"https://{domain}/sitemap.xml"]
+
+
+def iter_sitemap(url: str) -> Iterator[Tuple[str, str, Optional[str]]]:
+    """
+    Stream a sitemap and yield `(kind, loc, lastmod)` tuples.
+
+    `kind` is "sitemap" for entries of a sitemap index and "url" for entries
+    of a urlset. Parsed elements are cleared as we go to keep memory flat.
+    """
+    with _open(url) as stream:
+        root = None
+        for event, elem in iterparse(stream, events=("start", "end")):
+            if root is None:
+                root = elem
+                continue
+            if event != "end":
+                continue
+            tag = elem.tag.rsplit("}", 1)[-1]
+            if tag not in ("url", "sitemap"):
+                continue
+            loc, lastmod = None, None
+            for child in elem:
+                child_tag = child.tag.rsplit("}", 1)[-1]
+                if child_tag == "loc" and child.text:
+                    loc = child.text.strip()
+                elif child_tag == "lastmod" and child.text:
+                    lastmod = child.text.strip()
+            if loc:
+                yield tag, loc, lastmod
+            root.clear()
+
+
+# ---------------------------------------------------------------------
+# Index
+# ---------------------------------------------------------------------
+class BrandSitemapIndex:
+    """
+    Local product-URL index built from brand sitemaps.
+
+    On-disk layout (JSON):
+        {brand: {"domain": str,
+                 "sitemaps": {sitemap_url: {"lastmod": str | None,
+                                            "urls": {url: {"tokens": [...], "years": [...]}},
+                                            "children": [[child_url, lastmod], ...]}}}}
+    """
+
+    def __init__(self, path: str = SITEMAP_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data: Dict[str, dict] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError):
+                # An unreadable index is rebuilt on the next refresh.
+                logger.warning("Ignoring unreadable sitemap index %s", path, exc_info=True)
+
+    # -- refresh -------------------------------------------------------
+    def refresh(self, brand: str, domain: Optional[str] = None) -> int:
+        """Incrementally refresh one brand. Returns the number of sitemaps re-read."""
+        brand = brand.lower()
+        domain = domain or BRAND_DOMAINS[brand]
+        with self._lock:
+            previous = dict(self._data.get(brand, {}).get("sitemaps", {}))
+
+        sitemaps: Dict[str, dict] = {}
+        fetched = 0
+        pending = [(url, None, 0) for url in robots_sitemaps(domain)]
+        while pending:
+            sitemap_url, lastmod, depth = pending.pop()
+            cached = previous.get(sitemap_url)
+            if lastmod and cached and cached.get("lastmod") == lastmod:
+                sitemaps[sitemap_url] = cached
+                # An unchanged sitemap index still has to visit its (possibly changed) children.
+                pending.extend((loc, loc_lastmod, depth + 1) for loc, loc_lastmod in cached.get("children", []))
+                continue
+
+            urls: Dict[str, dict] = {}
+            children: List[Tuple[str, Optional[str]]] = []
+            try:
+                for kind, loc, loc_lastmod in iter_sitemap(sitemap_url):
+                    if kind == "sitemap":
+                        if depth < MAX_SITEMAP_DEPTH:
+                            children.append((loc, loc_lastmod))
+                            pending.append((loc, loc_lastmod, depth + 1))
+                    elif is_product_url(brand, loc):
+                        tokens, years = url_tokens(loc)
+                        urls[loc] = {"tokens": tokens, "years": years}
+            except Exception:
+                # Keep the previous snapshot of a sitemap that fails to load.
+                logger.warning("Failed to read sitemap %s for %s", sitemap_url, brand, exc_info=True)
+                if cached:
+                    sitemaps[sitemap_url] = cached
+                continue
+            fetched += 1
+            # Stored even without product URLs, so an unchanged `<lastmod>` skips it next time.
+            sitemaps[sitemap_url] = {"lastmod": lastmod, "urls": urls, "children": children}
+            # Save progress after every sitemap: a long refresh survives the process exiting.
+            with self._lock:
+                self._data[brand] = {"domain": domain, "sitemaps": {**previous, **sitemaps}}
+                self._save()
+
+        # Drop sitemaps that are no longer declared.
+        with self._lock:
+            self._data[brand] = {"domain": domain, "sitemaps": sitemaps}
+            self._save()
+        return fetched
+
+    def has_brand(self, brand: str) -> bool:
+        """True when the index already holds sitemaps for the brand."""
+        with self._lock:
+            return bool(self._data.get(brand.lower(), {}).get("sitemaps"))
+
+    def refresh_all(self, brands: Optional[Dict[str, str]] = None) -> None:
+        """Refresh every known brand; one failing brand does not stop the others."""
+        for brand, domain in (brands or BRAND_DOMAINS).items():
+            try:
+                self.refresh(brand, domain)
+            except Exception:
+                logger.warning("Failed to refresh sitemap index for %s (%s)", brand, domain, exc_info=True)
+
+    def start_background_refresh(self, brands: Optional[Dict[str, str]] = None) -> threading.Thread:
+        """Run `refresh_all` in a daemon thread so it never blocks the workflow."""
+        thread = threading.Thread(
+            target=self.refresh_all, args=(brands,), name="sitemap-indexer", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def _save(self) -> None:
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._data, f)
+        os.replace(tmp_path, self.path)
+
+    # -- lookup --------------------------------------------------------
+    def lookup(self, brand: str, model: str, year: Optional[str] = None, limit: int = 3) -> List[str]:
+        """
+        Return the best matching product URLs for brand/model/year.
+
+        A URL matches when every model token appears in its path (or the
+        tokens joined, e.g. 'track00'). Exact year matches rank first, URLs
+        naming a different year rank last, shorter slugs break ties.
+        """
+        model_tokens = tokenize(model)
+        if not model_tokens:
+            return []
+        joined = "".join(model_tokens)
+        with self._lock:
+            sitemaps = self._data.get(brand.lower(), {}).get("sitemaps", {})
+            entries = [(url, e) for s in sitemaps.values() for url, e in s["urls"].items()]
+
+        scored = []
+        for url, entry in entries:
+            if not is_product_url(brand, url):
+                continue
+            tokens = set(entry["tokens"])
+            if not (tokens.issuperset(model_tokens) or joined in tokens):
+                continue
+            years = entry["years"]
+            year_rank = 0 if year and year in years else (2 if years else 1)
+            scored.append((year_rank, len(tokens), url))
+        scored.sort()
+        return [url for _, _, url in scored[:limit]]
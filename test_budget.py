@@ -0,0 +1,39 @@
+"""
+test_budget.py
+
+Budget hooks run inside agno's async tool-hook chain.
+"""
+
+import asyncio
+
+from agno.tools.function import Function, FunctionCall
+
+from budget import RunBudget, current_budget, enforce_budget
+
+
+async def fetch_weight(model: str) -> str:
+    await asyncio.sleep(0)
+    return f"{model}: 7.8 kg"
+
+
+def _run_tool(budget: RunBudget) -> str:
+    async def run() -> str:
+        current_budget.set(budget)
+        function = Function.from_callable(fetch_weight)
+        function.tool_hooks = [enforce_budget]
+        call = FunctionCall(function=function, arguments={"model": "Track 00"})
+        result = await call.aexecute()
+        assert result.status == "success", result.error
+        return result.result
+
+    return asyncio.run(run())
+
+
+def test_enforce_budget_awaits_async_tool():
+    assert _run_tool(RunBudget()) == "Track 00: 7.8 kg"
+
+
+def test_enforce_budget_skips_tool_once_exhausted():
+    budget = RunBudget(max_tokens=10)
+    budget.charge_tokens(10)
+    assert _run_tool(budget).startswith("BUDGET EXHAUSTED (token budget of 10 used)")
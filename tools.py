@@ -1,36 +1,216 @@
 import asyncio
+import os
 import time
 import random
+from collections import OrderedDict
+from typing import Any, Dict, Generic, List, Optional, Tuple, TypeVar
+from urllib.parse import urldefrag
+
+from agno.run import RunContext
 from agno.tools import Toolkit
 from crawl4ai import AsyncWebCrawler, BrowserConfig, CrawlerRunConfig, CacheMode
 
+from budget import BUDGET_EXHAUSTED_MESSAGE, BudgetExceeded, current_budget
+from schemas import BikeWeightScraperOutput, ScraperRow
+
+# Shared page/extraction cache bounds (overridable via .env)
+CRAWL_CACHE_TTL_SECONDS = float(os.getenv("CRAWL_CACHE_TTL_SECONDS", "900"))
+CRAWL_CACHE_MAX_PAGES = int(os.getenv("CRAWL_CACHE_MAX_PAGES", "200"))
+# How long other lookups wait for an extraction claimed by another lookup before doing it themselves.
+EXTRACTION_CLAIM_SECONDS = float(os.getenv("EXTRACTION_CLAIM_SECONDS", "180"))
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """Small LRU cache whose entries expire after `ttl_seconds`."""
+
+    def __init__(self, max_items: int = CRAWL_CACHE_MAX_PAGES, ttl_seconds: float = CRAWL_CACHE_TTL_SECONDS):
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self._items: "OrderedDict[str, Tuple[float, V]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[V]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        stored_at, value = item
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: V) -> None:
+        self._items[key] = (time.monotonic(), value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+
+
+def _cache_key(url: str) -> str:
+    return urldefrag(url).url.rstrip("/")
+
 
 class CrawlTools(Toolkit):
     def __init__(self):
         super().__init__(name="crawl4ai_tool")
         self.register(self.crawl)
         self.register(self.random_sleep)
+        self.register(self.get_extracted_rows)
 
-    def random_sleep(self, min_seconds: int = 1, max_seconds: int = 5) -> str:
+        # Shared by every lookup on the event loop: one crawl (and one extraction)
+        # answers every target that selected the same URL.
+        self._pages: TTLCache[str] = TTLCache()
+        self._extractions: TTLCache[List[ScraperRow]] = TTLCache()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # URL -> (claiming scraper run_id, claimed at, future resolved with its rows)
+        self._claims: Dict[str, Tuple[Optional[str], float, asyncio.Future]] = {}
+        # run_id -> URL whose claimed extraction it is waiting for
+        self._waiting: Dict[str, str] = {}
+        self.crawl_requests = 0
+        self.crawl_count = 0
+
+    async def random_sleep(self, min_seconds: int = 1, max_seconds: int = 5) -> str:
         """Pause execution for a random amount of time to simulate human behavior."""
         if min_seconds < 0 or max_seconds < 0:
             return "Invalid time range"
         sleep_time = random.uniform(min_seconds, max_seconds)
-        time.sleep(sleep_time)
+        budget = current_budget.get()
+        if budget is not None:
+            # Never sleep past the run's deadline.
+            sleep_time = min(sleep_time, budget.remaining_seconds())
+        # asyncio.sleep keeps the event loop (and every other batched lookup) running.
+        await asyncio.sleep(sleep_time)
         return f"Waited {sleep_time:.2f} seconds"
 
-    def crawl(self, url: str) -> str:
+    async def get_extracted_rows(self, url: str, run_context: Optional[RunContext] = None) -> str:
+        """Returns the weight rows another lookup extracted from a URL, waiting if one is extracting it now."""
+        key = _cache_key(url)
+        run_id = run_context.run_id if run_context is not None else None
+        budget = current_budget.get()
+        while True:
+            rows = self._extractions.get(key)
+            if rows is not None:
+                return self._format_rows(url, rows)
+            claim = self._claims.get(key)
+            if claim is None or claim[0] == run_id or time.monotonic() - claim[1] > EXTRACTION_CLAIM_SECONDS:
+                # This lookup extracts the page; others asking meanwhile wait for its rows.
+                self._claims[key] = (run_id, time.monotonic(), asyncio.get_running_loop().create_future())
+                return f"No shared extraction for {url}; crawl it and extract every size/trim/year row."
+            if self._waits_on(claim[0], run_id):
+                # The claiming lookup is (indirectly) waiting for us: extract it here rather than deadlock.
+                return f"No shared extraction for {url}; crawl it and extract every size/trim/year row."
+            timeout = EXTRACTION_CLAIM_SECONDS - (time.monotonic() - claim[1])
+            if budget is not None:
+                timeout = min(timeout, budget.remaining_seconds())
+            if run_id is not None:
+                self._waiting[run_id] = key
+            try:
+                rows = await asyncio.wait_for(asyncio.shield(claim[2]), timeout=max(0.0, timeout))
+            except asyncio.TimeoutError:
+                if budget is not None and budget.exhausted_reason():
+                    return BUDGET_EXHAUSTED_MESSAGE.format(reason=budget.exhausted_reason())
+                continue
+            finally:
+                self._waiting.pop(run_id, None)
+            if rows:
+                return self._format_rows(url, rows)
+            # The claiming lookup found no weight: loop and claim the extraction ourselves.
+
+    def _waits_on(self, owner: Optional[str], run_id: Optional[str]) -> bool:
+        """True when `owner` is waiting, directly or through other lookups, for a URL claimed by `run_id`."""
+        seen = set()
+        while owner is not None and owner not in seen:
+            if owner == run_id:
+                return True
+            seen.add(owner)
+            claim = self._claims.get(self._waiting.get(owner, ""))
+            owner = claim[0] if claim is not None else None
+        return False
+
+    @staticmethod
+    def _format_rows(url: str, rows: List[ScraperRow]) -> str:
+        rows_json = "\n".join(row.model_dump_json() for row in rows)
+        return (
+            f"Already extracted from {url} by another lookup. These rows cover every "
+            f"size/trim/year weight listed on the page; reuse the matching rows:\n{rows_json}"
+        )
+
+    async def crawl(self, url: str) -> str:
         """Crawls a URL and returns the markdown content."""
+        key = _cache_key(url)
+        budget = current_budget.get()
+        self.crawl_requests += 1
+        while True:
+            content = self._pages.get(key)
+            if content is not None:
+                return content
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            # Another lookup is crawling this URL: wait for it (within our own deadline) instead of crawling again.
+            try:
+                content = await asyncio.wait_for(
+                    asyncio.shield(inflight), timeout=budget.remaining_seconds() if budget is not None else None
+                )
+            except asyncio.TimeoutError:
+                return BUDGET_EXHAUSTED_MESSAGE.format(reason="deadline reached")
+            if content is not None:
+                return content
+
+        if budget is not None:
+            try:
+                budget.charge_crawl(url)
+            except BudgetExceeded as e:
+                return BUDGET_EXHAUSTED_MESSAGE.format(reason=e)
+
+        self.crawl_count += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        content = None
+        try:
+            content = await self._fetch(url)
+            if not content.startswith("Error"):
+                self._pages.put(key, content)
+            return content
+        except BudgetExceeded as e:
+            return BUDGET_EXHAUSTED_MESSAGE.format(reason=e)
+        finally:
+            del self._inflight[key]
+            # Errors are shared with current waiters but not cached; None (e.g., this
+            # lookup ran out of budget) makes waiters crawl themselves.
+            future.set_result(content)
+
+    def record_extraction(self, run_output: Any, run_context: Optional[RunContext] = None) -> None:
+        """Post hook (scraper agent): share its OK rows and release the extractions it claimed."""
+        content = getattr(run_output, "content", None)
+        rows_by_url: Dict[str, List[ScraperRow]] = {}
+        if isinstance(content, BikeWeightScraperOutput):
+            # Only weights actually found are shared: NOT FOUND may just mean this lookup ran out of budget.
+            for row in content.extraction_results:
+                if row.status == "OK":
+                    rows_by_url.setdefault(_cache_key(row.url), []).append(row)
+        for key, rows in rows_by_url.items():
+            self._extractions.put(key, rows)
+
+        run_id = run_context.run_id if run_context is not None else None
+        for key, (owner, _, future) in list(self._claims.items()):
+            if owner == run_id or key in rows_by_url:
+                del self._claims[key]
+                if not future.done():
+                    future.set_result(rows_by_url.get(key))
+
+    async def _fetch(self, url: str) -> str:
         try:
-            return asyncio.run(self._async_crawl(url))
-        except RuntimeError as e:
-            import nest_asyncio
-            nest_asyncio.apply()
-            return asyncio.run(self._async_crawl(url))
+            return await self._async_crawl(url)
+        except BudgetExceeded:
+            raise
         except Exception as e:
             return f"Error crawling {url}: {str(e)}"
 
     async def _async_crawl(self, url: str) -> str:
+        budget = current_budget.get()
         browser_config = BrowserConfig(
             headless=True,
             viewport_width=1920,
@@ -43,12 +223,18 @@ class CrawlTools(Toolkit):
             remove_overlay_elements=True,
             magic=True,  # Crawl4ai magic handling
         )
+        if budget is not None:
+            # Never let a single page outlive the run's deadline.
+            # (a page_timeout of 0 would mean "no timeout" to Playwright)
+            crawler_config.page_timeout = max(1, min(crawler_config.page_timeout, int(budget.remaining_seconds() * 1000)))
 
         async with AsyncWebCrawler(config=browser_config) as crawler:
-            result = await crawler.arun(url=url, config=crawler_config)
+            page = crawler.arun(url=url, config=crawler_config)
+            # Cancel the in-flight page cooperatively once the budget is exhausted.
+            result = await (budget.guard(page) if budget is not None else page)
 
             if result.success:
                 content = result.markdown.fit_markdown or result.markdown.raw_markdown
                 return content[:70000]
             else:
-                return f"Error fetching content: {result.error_message}"
\ No newline at end of file
+                return f"Error fetching content: {result.error_message}"